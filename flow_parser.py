@@ -1,79 +1,312 @@
-import json
 import sys
 import os
 import base64
-import requests
 import hashlib
 import shutil
+import functools
+import errno
+import mmap
+import types
+import random
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# only read .env when the API key isn't exported at all; note this also skips any other
+# settings kept in .env (ENABLE_CACHE, CACHE_MAX_BYTES, CACHE_MAX_AGE) in that case
+if "OPENAI_API_KEY" not in os.environ:
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(override=False)
+    except Exception:
+        pass
 
+# write an error line to stderr in a single call (resolved per call so redirection still works)
+def _err(msg):
+    sys.stderr.write(msg + "\n")
+
+# pick the fastest available JSON backend: orjson -> rapidjson -> stdlib json
 try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except Exception:
-    pass
+    import orjson as _json
+
+    # map the file and parse the buffer in place instead of copying it into bytes first
+    def _load_json(f):
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty files and non-regular files (pipes) cannot be mapped
+            return _json.loads(f.read())
+        with mm, memoryview(mm) as buf:
+            return _json.loads(buf)
+except ImportError:
+    try:
+        import rapidjson as _json
+
+        def _load_json(f):
+            return _json.load(f, number_mode=_json.NM_NATIVE)
+    except ImportError:
+        import json as _json
+
+        def _load_json(f):
+            return _json.loads(f.read())
+
+_JSON_ERRORS = (_json.JSONDecodeError, ValueError)
 
 # load flow.json with error handling
 def load_flow(path):
     try:
-        with open(path, "r") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            return _load_json(f)
     except FileNotFoundError:
-        print(f"Error: file not found: {path}", file=sys.stderr)
+        _err(f"Error: file not found: {path}")
         return None
-    except json.JSONDecodeError as e:
-        print(f"Error: invalid JSON in {path}: {e}", file=sys.stderr)
+    except _JSON_ERRORS as e:
+        _err(f"Error: invalid JSON in {path}: {e}")
         return None
     except Exception as e:
-        print(f"Error: failed to read {path}: {e}", file=sys.stderr)
+        _err(f"Error: failed to read {path}: {e}")
         return None
 
+# shared read-only default for missing nested objects
+_EMPTY = types.MappingProxyType({})
+
+# step type tokens
+_MEDIA_TYPES = frozenset(("IMAGE", "VIDEO"))
+_CHAPTER = "CHAPTER"
+
+# copy-on-write cloning (Linux FICLONE ioctl; btrfs, XFS and other reflink filesystems)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_FICLONE = 0x40049409
+_reflink_supported = fcntl is not None and sys.platform.startswith("linux")
+
+# copy src to dst, sharing extents via reflink when possible and falling back to a regular copy
+def _fast_clone(src, dst):
+    global _reflink_supported
+    if _reflink_supported:
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return
+        except OSError as e:
+            # filesystem can't reflink (or src/dst on different devices); stop trying this run
+            if e.errno in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY):
+                _reflink_supported = False
+    shutil.copyfile(src, dst)
+
 # on-disk caching helpers (opt-in via ENABLE_CACHE=1)
 def get_cache_dir():
     return os.path.join(".cache")
 
+# cache limits, overridable via CACHE_MAX_BYTES / CACHE_MAX_AGE (seconds)
+_CACHE_MAX_BYTES = 500 << 20
+_CACHE_MAX_AGE = 7 * 86400
+_PRUNE_EVERY = 20
+
 def ensure_cache_dir():
     try:
         os.makedirs(get_cache_dir(), exist_ok=True)
     except Exception:
         pass
+    # sweep opportunistically rather than on every write
+    if random.randrange(_PRUNE_EVERY) == 0:
+        prune_cache()
 
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+# drop cache entries unused for max_age_s, then least recently used until under max_bytes
+# (hits refresh an entry's mtime via _touch, so mtime tracks last use, not write time)
+def prune_cache(max_bytes=None, max_age_s=None):
+    if max_bytes is None:
+        max_bytes = _env_int("CACHE_MAX_BYTES", _CACHE_MAX_BYTES)
+    if max_age_s is None:
+        max_age_s = _env_int("CACHE_MAX_AGE", _CACHE_MAX_AGE)
+
+    entries = []
+    try:
+        with os.scandir(get_cache_dir()) as it:
+            for entry in it:
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    except OSError:
+        return
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - max_age_s
+    for mtime, size, path in entries:
+        # sorted oldest first: once an entry is fresh and we're under budget, the rest are too
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+# 64-bit blake2b digest: same 16 hex chars as before, much cheaper than sha256
 def make_cache_key(text):
+    content = (text or "").encode("utf-8")
+    return hashlib.blake2b(content, digest_size=8).hexdigest()
+
+# key scheme used before the switch to blake2b
+def _legacy_cache_key(text):
     content = (text or "").encode("utf-8")
     return hashlib.sha256(content).hexdigest()[:16]
 
+# cache file for key_text (pure path computation, no filesystem access)
+def get_cache_path(prefix, key_text, ext):
+    return os.path.join(get_cache_dir(), f"{prefix}-{make_cache_key(key_text)}{ext}")
+
+# after a miss on path, move an entry stored under the old sha256 key into place; True if adopted
+def _adopt_legacy_entry(prefix, key_text, ext, path):
+    legacy_path = os.path.join(get_cache_dir(), f"{prefix}-{_legacy_cache_key(key_text)}{ext}")
+    try:
+        os.replace(legacy_path, path)
+        return True
+    except OSError:
+        return False
+
+# in-process LRU layered above the disk cache, keyed by cache file path
+_MEM_CACHE_SIZE = 128
+_SUMMARY_MEM = OrderedDict()
+_IMAGE_MEM_PATHS = OrderedDict()
+_MEM_LOCK = threading.Lock()
+
+def _mem_get(store, key):
+    with _MEM_LOCK:
+        value = store.get(key)
+        if value is not None:
+            store.move_to_end(key)
+        return value
+
+def _mem_put(store, key, value):
+    with _MEM_LOCK:
+        store[key] = value
+        store.move_to_end(key)
+        if len(store) > _MEM_CACHE_SIZE:
+            store.popitem(last=False)
+
+def _mem_drop(store, key):
+    with _MEM_LOCK:
+        store.pop(key, None)
+
+# read a whole (small) file with raw fd calls; None if it doesn't exist
+def _read_bytes(path, block=1 << 20):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, block)
+            # only an empty read is EOF: network and FUSE filesystems can return short reads early
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+    finally:
+        os.close(fd)
+
+def _read_cache_text(path):
+    data = _read_bytes(path)
+    return None if data is None else data.decode("utf-8")
+
+# bump mtime on a cache hit so prune_cache evicts least recently used entries first
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+# summary cache: memory first, then disk (promoted into memory on hit)
+def get_cached_summary(cache_path):
+    summary = _mem_get(_SUMMARY_MEM, cache_path)
+    if summary is not None:
+        return summary
+    try:
+        summary = _read_cache_text(cache_path)
+    except Exception:
+        return None
+    if summary is None:
+        return None
+    summary = summary.strip()
+    _touch(cache_path)
+    _mem_put(_SUMMARY_MEM, cache_path, summary)
+    return summary
+
+def put_cached_summary(cache_path, summary):
+    _mem_put(_SUMMARY_MEM, cache_path, summary)
+    ensure_cache_dir()
+    try:
+        with open(cache_path, "w", encoding="utf-8") as f:
+            f.write(summary)
+    except Exception:
+        pass
+
+# image cache: memory remembers which cache files exist, so repeat hits skip the stat;
+# legacy sha256-keyed entries are only looked for after the real probe misses
+def get_cached_image(cache_path, key_text):
+    if _mem_get(_IMAGE_MEM_PATHS, cache_path) is not None:
+        return cache_path
+    if os.path.exists(cache_path) or _adopt_legacy_entry("image", key_text, ".png", cache_path):
+        _mem_put(_IMAGE_MEM_PATHS, cache_path, True)
+        return cache_path
+    return None
+
+# clone into a temp name next to the entry and rename it into place, so a failed or
+# interrupted copy never leaves a truncated PNG under the live cache name
+def put_cached_image(src_path, cache_path):
+    ensure_cache_dir()
+    tmp_path = cache_path + ".part"
+    try:
+        _fast_clone(src_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return
+    _mem_put(_IMAGE_MEM_PATHS, cache_path, True)
+
 # shared helpers
 def is_cache_enabled():
     return os.getenv("ENABLE_CACHE", "1") == "1"
 
+# build the OpenAI client once per process (import + HTTP pool setup are not free)
+@functools.lru_cache(maxsize=1)
+def _get_openai_client():
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is not set in environment.")
+    from openai import OpenAI
+    return OpenAI()
+
+# serialize first construction so concurrent workers end up sharing one client
+_CLIENT_LOCK = threading.Lock()
+
 def get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        print("Error: OPENAI_API_KEY is not set in environment.", file=sys.stderr)
-        return None
     try:
-        from openai import OpenAI
-        return OpenAI()
+        with _CLIENT_LOCK:
+            return _get_openai_client()
     except Exception as e:
-        print(f"Error: failed to import OpenAI client: {e}", file=sys.stderr)
+        _err(f"Error: failed to create OpenAI client: {e}")
         return None
 
-def derive_actions(report):
-    steps = report.get("steps") or []
-    action_lines = []
-    actions = []
-    for s in steps:
-        step_type = s.get("type")
-        click_text = s.get("clickText")
-        title = s.get("pageTitle") or s.get("title")
-        if step_type == "CHAPTER" and title:
-            action_lines.append(f"CHAPTER: {title}")
-        elif click_text:
-            action_lines.append(f"{step_type}: {click_text}")
-            actions.append(click_text)
-        else:
-            action_lines.append(f"{step_type}: {title}" if title else str(step_type))
-    return action_lines, actions
-
 # extract only relevant metadata for quick reference
 def extract_meta(flow):
     return {
@@ -85,61 +318,120 @@ def extract_meta(flow):
         "created": flow.get("created"),
     }
 
-# extract CHAPTER steps (titles/subtitles) for summaries
-def extract_chapters(steps):
-    chapters = []
-    for s in steps or []:
-        if s.get("type") == "CHAPTER":
-            chapters.append({
-                "id": s.get("id"),
-                "title": s.get("title"),
-                "subtitle": s.get("subtitle"),
-            })
-    return chapters
-
-# extract core fields from steps (IMAGE/VIDEO context + clicks/hotspots)
-def extract_steps(steps):
-    out = []
-    for s in steps or []:
-        item = {"id": s.get("id"), "type": s.get("type")}
-        t = s.get("type")
+# unbound dict.get: get(s, key) skips creating a bound method per step
+_get = dict.get
 
-        if t in ("IMAGE", "VIDEO"):
-            page = s.get("pageContext") or {}
-            click = s.get("clickContext") or {}
-            hotspots = s.get("hotspots") or []
+# the summary prompt lists at most this many action lines
+_SUMMARY_ACTION_LIMIT = 25
 
-            item["pageTitle"] = page.get("title")
-            item["pageUrl"] = page.get("url")
+# format one extracted report step as a readable action line
+def _format_action(item):
+    t = item.get("type")
+    click_text = item.get("clickText")
+    title = item.get("pageTitle") or item.get("title")
+    if t == _CHAPTER and title:
+        return f"CHAPTER: {title}"
+    if click_text:
+        return f"{t}: {click_text}"
+    return f"{t}: {title}" if title else str(t)
 
-            if click:
-                item["clickText"] = click.get("text")
-                item["clickSelector"] = click.get("cssSelector")
-                item["clickElementType"] = click.get("elementType")
+# action lines and click texts recovered from a built report, for callers that don't pass them
+def derive_actions(report):
+    action_lines = []
+    actions = []
+    for s in report.get("steps") or []:
+        action_lines.append(_format_action(s))
+        click_text = s.get("clickText")
+        if click_text and s.get("type") != _CHAPTER:
+            actions.append(click_text)
+    return action_lines, actions
 
+# walk steps once, collecting chapters, core step fields and click texts together;
+# action lines are only formatted for the first _SUMMARY_ACTION_LIMIT steps
+def _walk_steps(steps):
+    chapters = []
+    out = []
+    action_lines = []
+    actions = []
+    add_chapter = chapters.append
+    add_item = out.append
+    add_line = action_lines.append
+    add_action = actions.append
+    get = _get
+
+    # per-type handlers: build the trimmed item and record only the output they produce
+    def media_step(s, t, sid):
+        page = get(s, "pageContext") or _EMPTY
+        click = get(s, "clickContext")
+        item = {
+            "id": sid,
+            "type": t,
+            "pageTitle": page.get("title"),
+            "pageUrl": page.get("url"),
+        }
+
+        if click:
+            click_text = click.get("text")
+            item["clickText"] = click_text
+            item["clickSelector"] = click.get("cssSelector")
+            item["clickElementType"] = click.get("elementType")
+            if click_text:
+                add_action(click_text)
+
+        # most steps carry zero or one hotspot: skip the empty case and use a plain loop,
+        # since a comprehension builds a function object per call before Python 3.12
+        hotspots = get(s, "hotspots")
+        if hotspots:
             labels = []
             for h in hotspots:
                 if isinstance(h, dict) and h.get("label"):
-                    labels.append(h.get("label"))
+                    labels.append(h["label"])
             if labels:
                 item["hotspotLabels"] = labels
+        return item
 
-        elif t == "CHAPTER":
-            item["title"] = s.get("title")
-            item["subtitle"] = s.get("subtitle")
+    def chapter_step(s, t, sid):
+        title = get(s, "title")
+        subtitle = get(s, "subtitle")
+        add_chapter({"id": sid, "title": title, "subtitle": subtitle})
+        return {"id": sid, "type": t, "title": title, "subtitle": subtitle}
 
-        out.append(item)
-    return out
+    handlers = dict.fromkeys(_MEDIA_TYPES, media_step)
+    handlers[_CHAPTER] = chapter_step
+    get_handler = handlers.get
 
-# build the final summary object
-def build_report(flow):
-    steps = flow.get("steps") or []
+    lines_left = _SUMMARY_ACTION_LIMIT
+    for s in steps or []:
+        t = get(s, "type")
+        sid = get(s, "id")
 
-    return {
+        handler = get_handler(t)
+        if handler is not None:
+            item = handler(s, t, sid)
+        else:
+            # other step types carry nothing beyond id/type
+            item = {"id": sid, "type": t}
+
+        add_item(item)
+        if lines_left:
+            lines_left -= 1
+            add_line(_format_action(item))
+    return chapters, out, action_lines, actions
+
+# single pass over a flow: (report, action_lines, actions), where action_lines covers only
+# the first _SUMMARY_ACTION_LIMIT steps; the derived lists stay off the report
+def summarize_flow(flow):
+    chapters, steps, action_lines, actions = _walk_steps(flow.get("steps"))
+    report = {
         "meta": extract_meta(flow),
-        "chapters": extract_chapters(steps),
-        "steps": extract_steps(steps),
+        "chapters": chapters,
+        "steps": steps,
     }
+    return report, action_lines, actions
+
+# build the final summary object
+def build_report(flow):
+    return summarize_flow(flow)[0]
 
 # write summary to markdown file
 def write_summary_to_file(summary_text, out_path="output/flow_summary.md"):
@@ -148,104 +440,319 @@ def write_summary_to_file(summary_text, out_path="output/flow_summary.md"):
         out_dir = os.path.dirname(out_path) or "."
         os.makedirs(out_dir, exist_ok=True)
 
-        # write markdown content
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write((summary_text or "").strip() + "\n")
+        # write markdown content straight to the fd (small payload, no text-layer buffering)
+        payload = ((summary_text or "").strip() + "\n").encode("utf-8")
+
+        # leave the file (and its mtime) alone when the content is already up to date
+        if _read_bytes(out_path) == payload:
+            return True
+
+        fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
         return True
     except Exception as e:
-        print(f"Error: failed to write summary to {out_path}: {e}", file=sys.stderr)
+        _err(f"Error: failed to write summary to {out_path}: {e}")
         return False
 
-# call OpenAI to produce brief summary of interactions
-def generate_openai_summary(report):
-    try:
-        client = get_openai_client()
-        if client is None:
-            return None
+# static system prompt for summaries; kept byte-for-byte stable and free of per-flow
+# content so OpenAI's automatic prompt caching can reuse it across calls (>1024 tokens)
+SUMMARY_SYSTEM_PROMPT = """You are a helpful assistant that analyzes user product flows recorded with Arcade, an interactive demo tool.
 
-        meta = report.get("meta") or {}
-        action_lines, _ = derive_actions(report)
+You will be provided with a name, use case, metadata, and a list of ordered actions that the user took.
+Your task is to first provide a summary of the user's goal and what they did based on the actions.
+Then, you will list all of the user's actions in order in a human readable format (e.g. "Clicked on checkout", "Searched for X").
 
-        # cap context at 25 actions to limit cost
-        joined_actions = "\n".join(action_lines[:25])
+Be clear, friendly, and avoid redundancy.
+Be sure to output your response in markdown format.
 
-        # caching (summary)
-        enable_cache = is_cache_enabled()
-        cache_key = make_cache_key((meta.get('name') or '') + "\n" + joined_actions + "\n" + "gpt-4o-mini")
-        cache_path = os.path.join(get_cache_dir(), f"summary-{cache_key}.md")
-        if enable_cache and os.path.exists(cache_path):
-            try:
-                with open(cache_path, "r", encoding="utf-8") as f:
-                    return f.read().strip()
-            except Exception:
-                pass
+# Input format
 
-        system_prompt = (
-            """You are a helpful assistant that analyzes user product flows.
+Every request contains the same three fields, in this order:
 
-            You will be provided with a name, use case, metadata, and a list of ordered actions that the user took.
-            Your task is to first provide a summary of the the user's goal and what they did based on the actions.
-            Then, you will list all of the user's actions in order in a human readable format (e.g.  (i.e. "Clicked on checkout", "Search for X").
-            
-            Be clear, friendly, and avoid redundancy.
-            Be sure to output your response in markdown format."""
-        )
-        user_prompt = (
-            f"Name: {meta.get('name')}\n"
-            f"Use Case: {meta.get('useCase')}\n\n"
-            "Actions (ordered):\n"
-            f"{joined_actions}"
-        )
+- Name: the title the author gave the recorded flow. It often states the goal directly (for example "Create a new invoice in QuickBooks").
+- Use Case: a short category assigned to the flow, such as "Onboarding", "Feature demo", "Support walkthrough" or "Checkout". It may be missing or "None".
+- Actions (ordered): one line per recorded step, oldest first. At most the first 25 steps are included, so long flows may end mid-way.
+
+Each action line has the form `<TYPE>: <text>` or just `<TYPE>`. The step types are:
+
+- CHAPTER: a title card the author inserted to introduce a section. The text is the chapter title. Chapters are narration, not user actions. Use them to understand intent and to structure the summary, but never list them as something the user did. A closing chapter such as "Thank you for your interest!" only marks the end of the demo.
+- IMAGE: a screenshot step. When the user clicked something, the text is the visible label of the clicked element (a button caption, link text, menu entry, search box, option value, and so on). When nothing was clicked, the text is the page title instead.
+- VIDEO: a screen-recording segment. Usually the user was scrolling, typing, hovering or waiting for a page to load. A bare `VIDEO` line carries no detail; only mention it when the surrounding steps make the activity obvious (for example scrolling through search results), and otherwise skip it.
+- Any other type (for example OVERLAY or EMBED) is author-added decoration. Ignore it unless its text clearly describes a user action.
+
+Click labels are raw UI text. They can be terse ("1", "Blue", "search"), repeated, or partially truncated. Interpret them in context: a bare number after an "Add to cart" click is most likely a quantity selection, a color name after a product page is most likely a variant choice, and "search" followed by a product name is a search for that product.
+
+# Output format
+
+Respond with markdown only. Do not wrap the answer in a code fence and do not add any preamble or closing remarks. Use exactly these two sections, in this order:
+
+## User Goal Summary
+Two to four sentences in plain prose. State what the user was trying to accomplish, on which product or website, and how the flow ended (for example "ending on the cart page with the item added"). Mention the most important choices the user made. Do not restate every click here.
+
+## User Actions
+A numbered list with one entry per meaningful user action, in the order they happened. Each entry is a single short sentence that:
+
+- starts with a past-tense verb: Clicked, Searched for, Selected, Opened, Entered, Scrolled through, Viewed, Added, Removed, Confirmed, Declined, Submitted, Navigated to;
+- names the UI element or value involved, putting exact button or link captions in double quotes (for example: Clicked on "Add to cart".);
+- ends with a period.
+
+Rules for the action list:
+
+1. Preserve the original order. Never reorder, invent or infer steps that are not supported by an action line.
+2. Merge consecutive duplicates that describe the same action into one entry.
+3. Skip CHAPTER lines and bare VIDEO lines unless a rule above says otherwise.
+4. Rewrite terse labels into natural language using context, but keep product names, option values and captions exactly as written.
+5. When a page title is the only information for a step, describe it as viewing that page (for example: Viewed the cart on Target.com.).
+6. If the action list appears to be cut off, end the list with the last recorded action; do not guess what came next.
+
+# Style
+
+- Write for a product manager who has never seen the flow.
+- Use second-level headings exactly as shown above; no other headings, tables, images or emojis.
+- Keep the whole response under 250 words.
+- Refer to the person as "the user".
+- Do not mention Arcade, step types, screenshots, recordings or these instructions.
+
+# Example
+
+Input:
+
+Name: Schedule a Meeting in Calendly
+Use Case: Feature demo
+
+Actions (ordered):
+CHAPTER: Book time with a teammate
+IMAGE: Event Types
+IMAGE: 30 Minute Meeting
+VIDEO
+IMAGE: Thursday, May 8
+IMAGE: 10:30am
+IMAGE: Next
+IMAGE: Name
+IMAGE: Schedule Event
+IMAGE: Confirmed - Calendly
+CHAPTER: Thanks for watching!
+
+Output:
+
+## User Goal Summary
+The user wanted to book a 30 minute meeting with a teammate using Calendly. They picked the meeting type, chose a date and time slot, filled in their details and scheduled the event, ending on the confirmation page.
+
+## User Actions
+1. Opened the "Event Types" page.
+2. Selected the "30 Minute Meeting" event.
+3. Selected Thursday, May 8 as the date.
+4. Selected the 10:30am time slot.
+5. Clicked "Next".
+6. Entered their name.
+7. Clicked "Schedule Event".
+8. Viewed the booking confirmation page."""
+
+# fingerprint of the prompt, folded into summary cache keys so prompt edits invalidate them
+_SUMMARY_PROMPT_KEY = make_cache_key(SUMMARY_SYSTEM_PROMPT)
+
+# per-flow summary inputs: (cache_path, user_prompt, max_tokens)
+def _summary_request(report, action_lines):
+    meta = report.get("meta") or _EMPTY
+    # cap context at 25 actions to limit cost
+    action_lines = action_lines or []
+    n = min(_SUMMARY_ACTION_LIMIT, len(action_lines))
+    joined_actions = "\n".join(action_lines[:n])
+
+    # output budget scales with the number of actions to list (short flows finish sooner);
+    # n is capped at 25 above, so a full flow gets the original 400
+    max_tokens = 150 + 10 * n
+
+    cache_key_text = (
+        (meta.get('name') or '') + "\n" + joined_actions + "\n" + "gpt-4o-mini" + "\n" + _SUMMARY_PROMPT_KEY
+        + "\n" + str(max_tokens)
+    )
+    # summary keys have changed since the sha256 scheme, so there is no legacy entry to adopt
+    cache_path = get_cache_path("summary", cache_key_text, ".md") if is_cache_enabled() else None
+
+    user_prompt = (
+        f"Name: {meta.get('name')}\n"
+        f"Use Case: {meta.get('useCase')}\n\n"
+        "Actions (ordered):\n"
+        f"{joined_actions}"
+    )
+    return cache_path, user_prompt, max_tokens
+
+# call OpenAI to produce brief summary of interactions; action_lines (from summarize_flow)
+# saves re-deriving them from the report
+def generate_openai_summary(report, *, action_lines=None):
+    try:
+        if action_lines is None:
+            action_lines, _ = derive_actions(report)
+
+        # caching (summary) - checked before touching the OpenAI SDK
+        enable_cache = is_cache_enabled()
+        cache_path, user_prompt, max_tokens = _summary_request(report, action_lines)
+        if enable_cache:
+            cached = get_cached_summary(cache_path)
+            if cached is not None:
+                return cached
+
+        client = get_openai_client()
+        if client is None:
+            return None
 
         # use small but sufficient model
         resp = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.2,
-            max_tokens=400,
+            max_tokens=max_tokens,
         )
 
         try:
-            summary = (resp.choices[0].message.content or "").strip()
+            choice = resp.choices[0]
+            summary = (choice.message.content or "").strip()
+            truncated = getattr(choice, "finish_reason", None) == "length"
         except Exception:
             summary = ""
+            truncated = False
 
         if not summary:
-            print("Error: received empty summary from OpenAI.", file=sys.stderr)
+            _err("Error: received empty summary from OpenAI.")
             return None
 
-        # write to cache
-        if enable_cache:
-            ensure_cache_dir()
-            try:
-                with open(cache_path, "w", encoding="utf-8") as f:
-                    f.write(summary)
-            except Exception:
-                pass
+        # a reply cut off at max_tokens is still returned, but never cached and replayed
+        if truncated:
+            _err("Warning: OpenAI summary hit the token limit and may be incomplete; not caching it.")
+        elif enable_cache:
+            put_cached_summary(cache_path, summary)
 
         return summary
 
     except Exception as e:
-        print(f"Error: OpenAI request failed: {e}", file=sys.stderr)
+        _err(f"Error: OpenAI request failed: {e}")
         return None
 
-# generate social media image
-def generate_social_image(report, out_path="output/flow_social_image.png"):
+# max flows packed into one batched summary request
+_SUMMARY_BATCH_SIZE = 8
+
+# flow number from a batched reply entry: JSON mode often returns ids as strings; bools are not ids
+def _batch_entry_id(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            return None
+    return None
+
+# summarize many parsed flows, packing cache misses into batched requests; returns summaries in input order
+def summarize_many(flows):
+    results = [None] * len(flows)
+    enable_cache = is_cache_enabled()
+
+    pending = []
+    for i, flow in enumerate(flows):
+        try:
+            report, action_lines, _ = summarize_flow(flow)
+            cache_path, user_prompt, max_tokens = _summary_request(report, action_lines)
+        except Exception as e:
+            _err(f"Error: failed to prepare flow {i} for summary: {e}")
+            continue
+        if enable_cache:
+            cached = get_cached_summary(cache_path)
+            if cached is not None:
+                results[i] = cached
+                continue
+        pending.append((i, cache_path, user_prompt, max_tokens))
+
+    if not pending:
+        return results
+
+    client = get_openai_client()
+    if client is None:
+        return results
+
+    for start in range(0, len(pending), _SUMMARY_BATCH_SIZE):
+        batch = pending[start:start + _SUMMARY_BATCH_SIZE]
+        flow_blocks = "\n\n".join(
+            f"Flow {n}:\n{user_prompt}" for n, (_, _, user_prompt, _) in enumerate(batch, 1)
+        )
+        # the system prompt asks for bare markdown; this request overrides only the outer wrapper
+        batch_prompt = (
+            "This request contains several flows. For this request only, ignore the instruction to "
+            "respond with markdown only: respond with a single JSON object and nothing else, of the form "
+            '{"summaries": [{"id": <flow number>, "markdown": "<summary>"}]}, '
+            "with exactly one entry per flow. Each markdown value must be that flow's complete summary, "
+            "following the Output format and Style rules above, encoded as a JSON string.\n\n"
+            f"{flow_blocks}"
+        )
+
+        # JSON string escaping and the wrapper cost extra tokens on top of each flow's markdown budget
+        batch_tokens = sum(budget * 5 // 4 + 20 for _, _, _, budget in batch)
+
+        try:
+            resp = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": batch_prompt},
+                ],
+                temperature=0.2,
+                max_tokens=batch_tokens,
+                response_format={"type": "json_object"},
+            )
+            choice = resp.choices[0]
+            truncated = getattr(choice, "finish_reason", None) == "length"
+            payload = _json.loads(choice.message.content or "{}")
+            entries = payload.get("summaries") or []
+        except Exception as e:
+            _err(f"Error: batched OpenAI request failed: {e}")
+            continue
+
+        if truncated:
+            _err("Warning: batched OpenAI summaries hit the token limit and may be incomplete; not caching them.")
+
+        # demultiplex back to per-flow results and cache entries (first entry per id wins)
+        matched = set()
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            n = _batch_entry_id(entry.get("id"))
+            summary = entry.get("markdown")
+            summary = summary.strip() if isinstance(summary, str) else ""
+            if n is None or not 1 <= n <= len(batch) or n in matched or not summary:
+                continue
+            matched.add(n)
+            i, cache_path, _, _ = batch[n - 1]
+            results[i] = summary
+            if enable_cache and not truncated:
+                put_cached_summary(cache_path, summary)
+
+        if len(matched) < len(batch):
+            _err(f"Error: batched OpenAI reply had usable summaries for {len(matched)} of {len(batch)} flows.")
+
+    return results
+
+# generate social media image; actions (from summarize_flow) saves re-deriving them from the report
+def generate_social_image(report, out_path="output/flow_social_image.png", *, actions=None):
     try:
-        client = get_openai_client()
-        if client is None:
-            return False
+        if actions is None:
+            _, actions = derive_actions(report)
 
-        meta = report.get("meta") or {}
+        meta = report.get("meta") or _EMPTY
 
         # build minimal context for image generation
         name = meta.get("name") or "User Flow"
 
         # extract key actions
-        _, actions = derive_actions(report)
         actions_summary = ", ".join(actions[:5]) if actions else "browsing and interacting"
 
         # prompt that uses flow metadata
@@ -256,18 +763,24 @@ def generate_social_image(report, out_path="output/flow_social_image.png"):
             f"Style: matching the flow's theme, professional, tech-focused. No text overlay needed."
         )
 
-        # caching (image)
+        # caching (image) - checked before touching the OpenAI SDK
         enable_cache = is_cache_enabled()
-        cache_key = make_cache_key(prompt + "\n" + "gpt-image-1")
-        cache_path = os.path.join(get_cache_dir(), f"image-{cache_key}.png")
-        if enable_cache and os.path.exists(cache_path):
+        cache_key_text = prompt + "\n" + "gpt-image-1"
+        cache_path = get_cache_path("image", cache_key_text, ".png") if enable_cache else None
+        if enable_cache and get_cached_image(cache_path, cache_key_text):
             try:
                 out_dir = os.path.dirname(out_path) or "."
                 os.makedirs(out_dir, exist_ok=True)
-                shutil.copyfile(cache_path, out_path)
+                _fast_clone(cache_path, out_path)
+                _touch(cache_path)
                 return True
             except Exception:
-                pass
+                # entry vanished from disk; forget it and regenerate
+                _mem_drop(_IMAGE_MEM_PATHS, cache_path)
+
+        client = get_openai_client()
+        if client is None:
+            return False
 
         # generate image using optimal model
         response = client.images.generate(
@@ -276,96 +789,78 @@ def generate_social_image(report, out_path="output/flow_social_image.png"):
             background="opaque"
         )
 
-        # handle base64 or URL payloads for gpt-image-1
+        # gpt-image-1 always returns inline base64, so no second download round-trip is needed
         image_data = response.data[0]
-        b64_payload = None
-        image_url = None
-
-        try:
-            # SDK object attributes
-            b64_payload = getattr(image_data, "b64_json", None)
-            image_url = getattr(image_data, "url", None)
-        except Exception:
-            pass
+        b64_payload = getattr(image_data, "b64_json", None)
 
         # fallback if dict-like
         if b64_payload is None and isinstance(image_data, dict):
             b64_payload = image_data.get("b64_json")
-            image_url = image_data.get("url", image_url)
 
         out_dir = os.path.dirname(out_path) or "."
         os.makedirs(out_dir, exist_ok=True)
 
         if b64_payload:
             try:
-                img_bytes = base64.b64decode(b64_payload)
                 with open(out_path, "wb") as f:
-                    f.write(img_bytes)
+                    f.write(base64.b64decode(b64_payload))
                 if enable_cache:
-                    ensure_cache_dir()
-                    try:
-                        with open(cache_path, "wb") as cf:
-                            cf.write(img_bytes)
-                    except Exception:
-                        pass
+                    # clone the written file instead of keeping the decoded bytes around for a second write
+                    put_cached_image(out_path, cache_path)
                 return True
             except Exception as decode_err:
-                print(f"Error: failed to decode base64 image: {decode_err}", file=sys.stderr)
+                _err(f"Error: failed to decode base64 image: {decode_err}")
                 return False
 
-        if image_url:
-            try:
-                with requests.get(image_url, stream=True, timeout=30) as r:
-                    r.raise_for_status()
-                    with open(out_path, "wb") as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                if enable_cache:
-                    ensure_cache_dir()
-                    try:
-                        shutil.copyfile(out_path, cache_path)
-                    except Exception:
-                        pass
-                return True
-            except Exception as download_err:
-                print(f"Error: failed to download image: {download_err}", file=sys.stderr)
-                return False
+        if getattr(image_data, "url", None):
+            _err("Error: image generation returned a URL instead of base64 data.")
+            return False
 
-        print("Error: image generation returned no data.", file=sys.stderr)
+        _err("Error: image generation returned no data.")
         return False
 
     except Exception as e:
-        print(f"Error: image generation failed: {e}", file=sys.stderr)
+        _err(f"Error: image generation failed: {e}")
         return False
 
 if __name__ == "__main__":
-    path = sys.argv[1] if len(sys.argv) > 1 else "flow.json"
+    args = sys.argv[1:]
+
+    # --no-cache forces fresh OpenAI calls for this run
+    if "--no-cache" in args:
+        args.remove("--no-cache")
+        os.environ["ENABLE_CACHE"] = "0"
+
+    path = args[0] if args else "flow.json"
 
     data = load_flow(path)
     if data is None:
         sys.exit(1)
 
-    # build the report
-    report = build_report(data)
-
-    # generate summary of the report
-    summary = generate_openai_summary(report)
+    # build the report, then drop the full parsed tree so only the trimmed report stays alive
+    report, action_lines, actions = summarize_flow(data)
+    del data
 
     # decide output paths
     summary_path = os.path.join("output", "flow_summary.md")
     image_path = os.path.join("output", "flow_social_image.png")
 
-    # write summary
-    if summary:
-        ok = write_summary_to_file(summary, summary_path)
-        if ok:
-            print(f"\n✓ Summary written to {summary_path}")
-    else:
-        print("\n(Note) OpenAI summary not available.")
-        placeholder = "# Flow Summary\n\nOpenAI summary not available. See stderr for details."
-        write_summary_to_file(placeholder, summary_path)
-
-    # generate social media image
-    if generate_social_image(report, image_path):
-        print(f"✓ Social image written to {image_path}")
\ No newline at end of file
+    # summary and image are independent network-bound calls, so run them concurrently
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        summary_future = ex.submit(generate_openai_summary, report, action_lines=action_lines)
+        image_future = ex.submit(generate_social_image, report, image_path, actions=actions)
+
+        # write summary as soon as it lands, while the image may still be generating
+        summary = summary_future.result()
+        if summary:
+            ok = write_summary_to_file(summary, summary_path)
+            if ok:
+                print(f"\n✓ Summary written to {summary_path}")
+        else:
+            print("\n(Note) OpenAI summary not available.")
+            placeholder = "# Flow Summary\n\nOpenAI summary not available. See stderr for details."
+            write_summary_to_file(placeholder, summary_path)
+
+        # report social media image
+        if image_future.result():
+            print(f"✓ Social image written to {image_path}")